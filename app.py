@@ -1,8 +1,9 @@
 import os
-from flask import Flask, redirect, url_for
+import click
+from flask import Flask, redirect, url_for, session
 from config import config_by_name
 from extensions import db, migrate, bcrypt, login_manager
-from models.models import User
+from models.models import User, UserRole
 
 def create_app(config_name):
     app = Flask(__name__)
@@ -13,6 +14,11 @@ def create_app(config_name):
     migrate.init_app(app, db)
     bcrypt.init_app(app)
     login_manager.init_app(app)
+
+    # Guarda as sessões no servidor; o cookie leva apenas o id da sessão
+    from utils import session_store
+    session_store.init_app(app)
+
     from models.models import User, Dish, Menu, Reservation 
 
     # --- Configuração do Flask-Login ---
@@ -25,8 +31,17 @@ def create_app(config_name):
     @login_manager.user_loader
     def load_user(user_id):
         # Esta função é usada pelo Flask-Login para recarregar o objeto do usuário
-        # a partir do ID de usuário armazenado na sessão.
-        return User.query.get(int(user_id))
+        # a partir do ID de usuário armazenado na sessão (ou no cookie "lembrar de mim").
+        # O ID inclui a versão de sessão do usuário (User.get_id); se ela mudou, as
+        # sessões foram revogadas e o login deixa de valer.
+        parsed = User.parse_id(user_id)
+        user = db.session.get(User, parsed[0]) if parsed else None
+        if user is None or user.session_version != parsed[1]:
+            # Descarta o login revogado e apaga o cookie "lembrar de mim".
+            session.pop('_user_id', None)
+            session['_remember'] = 'clear'
+            return None
+        return user
 
     with app.app_context():
         # --- Importa e Registra os Blueprints ---
@@ -39,11 +54,58 @@ def create_app(config_name):
         from routes.management import management_bp
         app.register_blueprint(management_bp)
 
+        from routes.reservation import reservation_bp
+        app.register_blueprint(reservation_bp)
+
+        from routes.waiting_room import waiting_room_bp
+        app.register_blueprint(waiting_room_bp)
+
         # --- Rota Principal ---
         @app.route('/')
         def index():
             return redirect(url_for('auth.login'))
 
+    # --- Chaves de Idempotência ---
+    from utils.idempotency import new_idempotency_key, purge_expired_keys
+    # Disponibiliza a geração de chaves para os formulários de reserva
+    app.jinja_env.globals['new_idempotency_key'] = new_idempotency_key
+
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Remove as chaves de idempotência expiradas (rodar periodicamente, ex: via cron)."""
+        deleted = purge_expired_keys()
+        print(f'{deleted} chave(s) de idempotência expirada(s) removida(s).')
+
+    # --- Cache de Fragmentos dos Templates ---
+    from utils.fragment_cache import FragmentCacheExtension, menu_cache_key
+    from utils.lru_cache import LRUCache
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = LRUCache(app.config['FRAGMENT_CACHE_SIZE'])
+    app.jinja_env.fragment_cache_ttl = app.config['FRAGMENT_CACHE_TTL']
+    app.jinja_env.globals['menu_cache_key'] = menu_cache_key
+
+    # --- Sessões no Servidor ---
+    @app.cli.command('purge-sessions')
+    def purge_sessions_command():
+        """Remove as sessões expiradas (rodar periodicamente, ex: via cron)."""
+        deleted = session_store.purge_expired_sessions(app)
+        print(f'{deleted} sessão(ões) expirada(s) removida(s).')
+
+    @app.cli.command('revoke-sessions')
+    @click.option('--user-id', type=int, help='Encerra as sessões deste usuário.')
+    @click.option('--role', type=click.Choice([role.name for role in UserRole]),
+                  help='Encerra as sessões de todos os usuários deste perfil.')
+    def revoke_sessions_command(user_id, role):
+        """Encerra as sessões de um usuário ou de um perfil, forçando um novo login."""
+        if user_id is None and role is None:
+            raise click.UsageError('Informe --user-id ou --role.')
+        deleted = 0
+        if user_id is not None:
+            deleted += session_store.revoke_user_sessions(app, user_id)
+        if role is not None:
+            deleted += session_store.revoke_role_sessions(app, UserRole[role])
+        print(f'{deleted} sessão(ões) encerrada(s).')
+
     return app
 
 # --- Execução da Aplicação ---
@@ -0,0 +1,77 @@
+"""
+Microbenchmark de renderização da lista de cardápios com e sem o cache de fragmentos.
+
+Monta uma visão de mês com MENUS cardápios de DISHES pratos cada (SQLite temporário)
+e mede o tempo de render_template de management/list_menus.html.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_fragment_cache.py [--menus 300] [--dishes 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from flask import render_template
+
+from app import create_app
+from extensions import db
+from models.models import Dish, Menu, MealType
+from utils.lru_cache import LRUCache
+
+REPEAT = 5
+NUMBER = 20
+
+
+def setup(app, menus, dishes):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        all_dishes = [Dish(name=f'Prato {i}', description='Descrição do prato') for i in range(dishes * 4)]
+        db.session.add_all(all_dishes)
+        start = date.today()
+        for i in range(menus):
+            menu = Menu(date=start + timedelta(days=i // 2), meal_type=list(MealType)[i % 2])
+            menu.dishes.extend(all_dishes[(i % 4) * dishes:(i % 4 + 1) * dishes])
+            db.session.add(menu)
+        db.session.commit()
+
+
+def measure(app, menus):
+    def render():
+        render_template('management/list_menus.html', menus=menus)
+
+    render() # Aquece o template (e o cache, quando ativo)
+    return min(timeit.repeat(render, number=NUMBER, repeat=REPEAT)) / NUMBER
+
+
+def main(menu_count, dish_count):
+    app = create_app('test')
+    setup(app, menu_count, dish_count)
+
+    with app.test_request_context():
+        menus = Menu.query.order_by(Menu.date.desc()).all()
+
+        app.jinja_env.fragment_cache = None
+        uncached = measure(app, menus)
+
+        app.jinja_env.fragment_cache = LRUCache(app.config['FRAGMENT_CACHE_SIZE'])
+        cached = measure(app, menus)
+
+    print(f'{menu_count} cardápios x {dish_count} pratos')
+    print(f'  sem cache: {uncached * 1000:.2f} ms por renderização')
+    print(f'  com cache: {cached * 1000:.2f} ms por renderização ({uncached / cached:.1f}x mais rápido)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--menus', type=int, default=300)
+    parser.add_argument('--dishes', type=int, default=8)
+    args = parser.parse_args()
+    main(args.menus, args.dishes)
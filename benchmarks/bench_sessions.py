@@ -0,0 +1,94 @@
+"""
+Benchmark do custo por requisição das sessões no servidor, comparado ao cookie assinado.
+
+Mede, para um usuário logado com algumas mensagens flash e chaves de idempotência na
+sessão, o tempo de uma página que só lê a sessão e de outra que a altera, quantos
+comandos SQL a sessão acrescenta e o tamanho do cookie enviado em cada requisição.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_sessions.py [--requests 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from flask.sessions import SecureCookieSessionInterface
+from sqlalchemy import event
+
+from app import create_app
+from extensions import db, bcrypt
+from models.models import User, Menu, MealType
+
+PASSWORD = 'senha'
+
+
+def setup(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(full_name='Usuário', email='u@ifc.edu.br',
+                            password_hash=bcrypt.generate_password_hash(PASSWORD).decode('utf-8')))
+        menus = [Menu(date=date.today() + timedelta(days=i), meal_type=MealType.ALMOCO) for i in range(1, 11)]
+        db.session.add_all(menus)
+        db.session.commit()
+        return [menu.id for menu in menus]
+
+
+def measure(app, label, menu_ids, requests):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'u@ifc.edu.br', 'password': PASSWORD, 'remember': 'on'})
+    # Reservas com chave deixam a sessão com o tamanho típico de um usuário ativo.
+    for menu_id in menu_ids:
+        client.post(f'/reservas/menu/{menu_id}', headers={'Idempotency-Key': f'bench-{menu_id}'})
+    client.get('/dashboard/minhas-reservas') # Consome as mensagens flash
+
+    with app.app_context():
+        engine = db.engine
+    statements = [0]
+    count = lambda *args: statements.__setitem__(0, statements[0] + 1)
+    event.listen(engine, 'before_cursor_execute', count)
+
+    def run(path, method='get', **kwargs):
+        statements[0] = 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            getattr(client, method)(path, **kwargs)
+        return (time.perf_counter() - start) / requests * 1000, statements[0] / requests
+
+    read_ms, read_sql = run('/dashboard/minhas-reservas')
+    # Reenvio de uma reserva já concluída: a resposta guardada regrava a mensagem flash na sessão.
+    write_ms, write_sql = run(f'/reservas/menu/{menu_ids[0]}', method='post',
+                              headers={'Idempotency-Key': f'bench-{menu_ids[0]}'})
+    event.remove(engine, 'before_cursor_execute', count)
+
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    size = len(cookie.key) + 1 + len(cookie.value)
+    print(f'{label:>16}: leitura {read_ms:.2f} ms ({read_sql:.1f} SQL), '
+          f'gravação {write_ms:.2f} ms ({write_sql:.1f} SQL), cookie {size} bytes')
+
+
+def main(requests):
+    app = create_app('test')
+    app.config['SESSION_INVALIDATION_CHECK_INTERVAL'] = 1 # Valor de produção
+    app.session_interface.store.invalidation_check_interval = 1
+    menu_ids = setup(app)
+    measure(app, 'sessão no banco', menu_ids, requests)
+
+    app = create_app('test')
+    app.session_interface = SecureCookieSessionInterface()
+    menu_ids = setup(app)
+    measure(app, 'cookie assinado', menu_ids, requests)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+    main(args.requests)
@@ -0,0 +1,132 @@
+"""
+Harness de carga local para a abertura das reservas, com e sem a sala de espera.
+
+Simula o pico: CLIENTS usuários já logados enviam a reserva ao mesmo tempo contra um
+banco com capacidade limitada (pool pequeno, timeout curto e latência artificial por
+comando SQL). Cada cliente segue a sala de espera como o navegador faria: consulta
+/fila/status até ser admitido e reenvia o formulário com a senha.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/load_harness.py [--clients 150] [--rate 20]
+
+A taxa deve ficar abaixo da capacidade do banco simulado (cerca de 30 reservas/s);
+acima disso, as reservas admitidas voltam a esgotar o pool.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db'))
+
+from sqlalchemy import event, text
+
+from app import create_app
+from config import config_by_name, Config, TestingConfig
+from extensions import db, bcrypt
+from models.models import User, Menu, MealType, Reservation
+
+
+class LoadTestConfig(TestingConfig):
+    # Banco "saturado": poucas conexões, espera curta por uma conexão livre.
+    SQLALCHEMY_ENGINE_OPTIONS = dict(pool_size=4, max_overflow=0, pool_timeout=1)
+    SESSION_INVALIDATION_CHECK_INTERVAL = Config.SESSION_INVALIDATION_CHECK_INTERVAL # Valor de produção
+
+
+config_by_name['load'] = LoadTestConfig
+STATEMENT_LATENCY = 0.01 # Segundos somados a cada comando SQL
+PASSWORD = 'senha'
+
+
+def setup(app, clients):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+        db.session.add_all(User(full_name=f'Usuário {i}', email=f'u{i}@ifc.edu.br', password_hash=password_hash)
+                           for i in range(clients))
+        menu = Menu(date=date.today() + timedelta(days=1), meal_type=MealType.ALMOCO)
+        db.session.add(menu)
+        db.session.commit()
+        menu_id = menu.id
+
+    test_clients = []
+    for i in range(clients):
+        client = app.test_client()
+        client.post('/auth/login', data={'email': f'u{i}@ifc.edu.br', 'password': PASSWORD})
+        test_clients.append(client)
+    return menu_id, test_clients
+
+
+def run_client(client, menu_id, result):
+    start = time.perf_counter()
+    url = f'/reservas/menu/{menu_id}'
+    data = {'idempotency_key': os.urandom(8).hex()}
+    try:
+        while True:
+            response = client.post(url, data=data)
+            if response.status_code != 303:
+                break
+            # Na fila: consulta o status até ser admitido, como a página de espera.
+            ticket = parse_qs(urlparse(response.headers['Location']).query)['ticket'][0]
+            while True:
+                status = client.get('/fila/status', query_string={'ticket': ticket}).get_json()
+                if status['admitted']:
+                    break
+                time.sleep(min(max(status['eta'] / 4, 0.05), 1))
+            data['queue_ticket'] = ticket
+        result['ok'] = response.status_code == 302
+    except Exception:
+        result['ok'] = False
+    result['elapsed'] = time.perf_counter() - start
+
+
+def run(waiting_room, clients, rate):
+    app = create_app('load')
+    app.config.update(
+        PROPAGATE_EXCEPTIONS=False, # Erros viram respostas 500, como em produção
+        WAITING_ROOM_ENABLED=waiting_room,
+        WAITING_ROOM_RATES=dict(ALMOCO=rate, JANTA=rate),
+        WAITING_ROOM_BURST=4,
+    )
+    menu_id, test_clients = setup(app, clients)
+
+    with app.app_context():
+        engine = db.engine
+        # WAL faz leituras não esperarem pelas escritas, como no PostgreSQL (MVCC).
+        db.session.execute(text('PRAGMA journal_mode=WAL'))
+        db.session.commit()
+    event.listen(engine, 'before_cursor_execute', lambda *args: time.sleep(STATEMENT_LATENCY))
+
+    results = [{} for _ in test_clients]
+    threads = [threading.Thread(target=run_client, args=(client, menu_id, result))
+               for client, result in zip(test_clients, results)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+
+    with app.app_context():
+        reservations = Reservation.query.count()
+    errors = sum(1 for result in results if not result['ok'])
+    elapsed = sorted(result['elapsed'] for result in results)
+    label = 'com sala de espera' if waiting_room else 'sem sala de espera'
+    print(f'{label:>20}: erros {errors}/{clients} ({errors / clients:.0%}), reservas {reservations}, '
+          f'tempo total {total:.2f}s, mediana {elapsed[len(elapsed) // 2]:.2f}s, máximo {elapsed[-1]:.2f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=150)
+    parser.add_argument('--rate', type=float, default=20, help='Reservas admitidas por segundo')
+    args = parser.parse_args()
+    run(False, args.clients, args.rate)
+    run(True, args.clients, args.rate)
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from dotenv import load_dotenv
 
 # Carrega as variáveis de ambiente do arquivo .env
@@ -10,6 +11,38 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'uma-chave-secreta-de-fallback-muito-dificil'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Chaves de idempotência das rotas de reserva
+    IDEMPOTENCY_KEY_TTL = timedelta(hours=24) # Tempo que uma resposta fica guardada para reenvios
+    IDEMPOTENCY_WAIT_TIMEOUT = 10 # Segundos que uma requisição duplicada espera pela original
+    # Segundos após os quais uma chave ainda em processamento é considerada abandonada
+    # (ex: o worker morreu no meio da requisição) e pode ser assumida por um reenvio
+    IDEMPOTENCY_LEASE_TIMEOUT = 3 * IDEMPOTENCY_WAIT_TIMEOUT
+
+    # Sala de espera da abertura das reservas
+    WAITING_ROOM_ENABLED = True
+    WAITING_ROOM_RATES = dict( # Total de reservas admitidas por segundo, por tipo de refeição (MealType)
+        ALMOCO=20,
+        JANTA=10,
+    )
+    WAITING_ROOM_BURST = 20 # Reservas admitidas de imediato quando não há fila
+    # Número de workers da aplicação; taxa e rajada são divididas entre eles
+    WAITING_ROOM_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+    WAITING_ROOM_ADMISSION_WINDOW = 120 # Segundos para usar a senha depois de admitido
+    WAITING_ROOM_TICKET_MAX_AGE = 1800 # Validade máxima de uma senha da fila, em segundos
+    WAITING_ROOM_MEAL_TYPE_TTL = 60 # Segundos que cada worker guarda o MealType de um cardápio
+
+    # Cache de fragmentos renderizados dos templates ({% cache %})
+    FRAGMENT_CACHE_SIZE = 2048 # Número máximo de fragmentos guardados
+    FRAGMENT_CACHE_TTL = 3600 # Validade padrão de um fragmento, em segundos
+
+    # Sessões guardadas no servidor (o cookie leva apenas o id da sessão)
+    PERMANENT_SESSION_LIFETIME = timedelta(days=7) # Validade das sessões no servidor
+    SESSION_CACHE_SIZE = 4096 # Sessões mantidas no cache de leitura de cada processo
+    SESSION_CACHE_TTL = 30 # Segundos que uma sessão fica no cache antes de ser relida do banco
+    SESSION_PURGE_BATCH_SIZE = 1000 # Sessões expiradas removidas por lote na limpeza
+    SESSION_INVALIDATION_CHECK_INTERVAL = 1 # Segundos entre as consultas às sessões alteradas por outros processos
+    SESSION_SKIP_BLUEPRINTS = ('waiting_room',) # Blueprints que não carregam a sessão (ex: consultas da fila)
+
 class DevelopmentConfig(Config):
     """Configurações específicas para o ambiente de desenvolvimento."""
     DEBUG = True
@@ -23,6 +56,15 @@ class DevelopmentConfig(Config):
     
     SQLALCHEMY_DATABASE_URI = f"postgresql+psycopg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+class TestingConfig(Config):
+    """Configurações usadas pelos testes automatizados (pasta tests/), com SQLite."""
+    TESTING = True
+    BCRYPT_LOG_ROUNDS = 4 # Hash de senha rápido nos testes
+    WAITING_ROOM_ENABLED = False # Os testes da sala de espera ativam quando precisam
+    SESSION_INVALIDATION_CHECK_INTERVAL = 0 # Mudanças em um processo valem na hora para os demais
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
+        'sqlite:///' + os.path.join(basedir, 'test.db')
+
 # Você pode adicionar outras classes de configuração no futuro
 # class ProductionConfig(Config):
 #     DEBUG = False
@@ -31,5 +73,6 @@ class DevelopmentConfig(Config):
 # Dicionário para facilitar a escolha da configuração no app.py
 config_by_name = dict(
     dev=DevelopmentConfig,
+    test=TestingConfig,
     # prod=ProductionConfig
 )
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""Adiciona carimbos de versão (updated_at) em dish e menu
+
+Revision ID: 5f0a9d3e7c12
+Revises: 8d41c6a5e2b7
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0a9d3e7c12'
+down_revision = '8d41c6a5e2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('dish', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+
+    with op.batch_alter_table('menu', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+
+
+def downgrade():
+    with op.batch_alter_table('menu', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('dish', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,40 @@
+"""Adiciona a versão de sessão dos usuários e o registro de sessões invalidadas
+
+Revision ID: a7c3e9d15b28
+Revises: 5f0a9d3e7c12
+Create Date: 2026-10-20 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9d15b28'
+down_revision = '5f0a9d3e7c12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('session_version', sa.Integer(), nullable=False, server_default='1'))
+
+    op.create_table('session_invalidation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('session_id', sa.String(length=64), nullable=False),
+    sa.Column('invalidated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('session_invalidation', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_session_invalidation_invalidated_at'), ['invalidated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('session_invalidation', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_session_invalidation_invalidated_at'))
+
+    op.drop_table('session_invalidation')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('session_version')
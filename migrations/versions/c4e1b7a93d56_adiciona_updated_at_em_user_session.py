@@ -0,0 +1,28 @@
+"""Adiciona updated_at em user_session
+
+Revision ID: c4e1b7a93d56
+Revises: a7c3e9d15b28
+Create Date: 2026-10-21 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1b7a93d56'
+down_revision = 'a7c3e9d15b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.create_index(batch_op.f('ix_user_session_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_session', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_session_updated_at'))
+        batch_op.drop_column('updated_at')
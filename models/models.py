@@ -38,10 +38,26 @@ class User(db.Model, UserMixin):
     is_scholarship_student = db.Column(db.Boolean, default=False) # Para [US11]
     credits = db.Column(db.Numeric(10, 2), default=0.00) # Para [US12]
     dietary_restrictions = db.Column(db.Text, nullable=True) # Para [US14]
+    # Incrementada ao revogar as sessões do usuário; invalida também o cookie "lembrar de mim"
+    session_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     # Relacionamento: Um usuário pode ter várias reservas
     reservations = db.relationship('Reservation', backref='user', lazy=True)
 
+    def get_id(self):
+        # Valor guardado pelo Flask-Login na sessão e no cookie "lembrar de mim".
+        # Com a versão junto do id, ambos deixam de valer quando as sessões são revogadas.
+        return f'{self.id}:{self.session_version}'
+
+    @staticmethod
+    def parse_id(value):
+        """Separa um valor gerado por get_id() em (id, session_version). Retorna None se for inválido."""
+        try:
+            user_id, version = value.split(':')
+            return int(user_id), int(version)
+        except (AttributeError, ValueError):
+            return None
+
     def __repr__(self):
         return f'<User {self.email}>'
 
@@ -50,6 +66,8 @@ class Dish(db.Model):
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text, nullable=True)
     nutritional_info = db.Column(db.Text, nullable=True) # Para [US04]
+    # Carimbo de versão usado nas chaves do cache de fragmentos dos templates
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<Dish {self.name}>'
@@ -58,6 +76,9 @@ class Menu(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     meal_type = db.Column(db.Enum(MealType), nullable=False)
+    # Carimbo de versão usado nas chaves do cache de fragmentos dos templates.
+    # Mudanças só na lista de pratos não alteram a linha, então a rota de edição atualiza manualmente.
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relacionamento Muitos-para-Muitos com Dish
     # Um cardápio (menu) é composto por vários pratos (dishes)
@@ -80,4 +101,45 @@ class Reservation(db.Model):
     menu_id = db.Column(db.Integer, db.ForeignKey('menu.id'), nullable=False)
 
     def __repr__(self):
-        return f'<Reservation {self.id} by User {self.user_id}>'
\ No newline at end of file
+        return f'<Reservation {self.id} by User {self.user_id}>'
+
+class IdempotencyKey(db.Model):
+    # Guarda o resultado de requisições que alteram estado (reservas/cancelamentos)
+    # para que reenvios com a mesma chave devolvam a resposta original sem refazer o trabalho.
+    # status_code fica vazio enquanto a primeira requisição ainda está em processamento.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    request_path = db.Column(db.String(128), nullable=False)
+    status_code = db.Column(db.SmallInteger, nullable=True)
+    location = db.Column(db.String(256), nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    flashes = db.Column(db.Text, nullable=True) # Mensagens flash geradas, em JSON
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} by User {self.user_id}>'
+
+
+class UserSession(db.Model):
+    # Sessões guardadas no servidor: o cookie do navegador leva apenas o id (opaco e assinado).
+    # user_id permite revogar de uma vez todas as sessões de um usuário ou de um perfil.
+    id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    data = db.Column(db.Text, nullable=False) # Conteúdo da sessão serializado
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    # Usado pelos outros processos para descobrir quais sessões em cache foram alteradas
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<UserSession {self.id} of User {self.user_id}>'
+
+class SessionInvalidation(db.Model):
+    # Registro das sessões removidas (logout, revogação). Cada processo consulta os registros
+    # novos periodicamente para tirar essas sessões do seu cache de leitura.
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(64), nullable=False)
+    invalidated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<SessionInvalidation {self.session_id}>'
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
-from models.models import Menu
+from sqlalchemy.orm import joinedload
+from models.models import Menu, Reservation
 from datetime import date # Para pegar a data de hoje
 
 dashboard_bp = Blueprint(
@@ -42,4 +43,8 @@ def my_reservations():
     """
     Página para o usuário ver seu histórico de agendamentos ([US06], [US07]).
     """
-    return render_template('dashboard/my_reservations.html')
\ No newline at end of file
+    # joinedload traz o cardápio de cada reserva na mesma consulta (evita N+1 no template).
+    reservations = Reservation.query.filter_by(user_id=current_user.id) \
+        .options(joinedload(Reservation.menu)) \
+        .order_by(Reservation.reservation_timestamp.desc()).all()
+    return render_template('dashboard/my_reservations.html', reservations=reservations)
\ No newline at end of file
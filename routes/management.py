@@ -7,7 +7,7 @@ privilegiados como Nutricionista e Administrador.
 Inclui o Gerenciamento de Pratos (Dishes) e de Cardápios (Menus).
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required
 from datetime import datetime
 
@@ -15,6 +15,7 @@ from datetime import datetime
 from models.models import Dish, Menu, UserRole, MealType
 from extensions import db
 from utils.decorators import role_required
+from utils.signals import menu_changed
 
 # Definição do Blueprint
 management_bp = Blueprint(
@@ -138,6 +139,7 @@ def add_menu():
             
             db.session.add(new_menu)
             db.session.commit()
+            menu_changed.send(current_app._get_current_object(), menu_id=new_menu.id)
             flash('Cardápio criado com sucesso!', 'success')
             return redirect(url_for('management.list_menus'))
 
@@ -169,8 +171,11 @@ def edit_menu(menu_id):
             selected_dishes = Dish.query.filter(Dish.id.in_(dish_ids)).all()
             # 3. Adiciona os novos pratos à lista.
             menu.dishes.extend(selected_dishes)
+            # 4. Atualiza o carimbo de versão, que invalida os fragmentos em cache do cardápio.
+            menu.updated_at = datetime.utcnow()
 
             db.session.commit()
+            menu_changed.send(current_app._get_current_object(), menu_id=menu.id)
             flash('Cardápio atualizado com sucesso!', 'success')
             return redirect(url_for('management.list_menus'))
 
@@ -196,5 +201,6 @@ def delete_menu(menu_id):
 
     db.session.delete(menu)
     db.session.commit()
+    menu_changed.send(current_app._get_current_object(), menu_id=menu_id)
     flash('Cardápio removido com sucesso!', 'success')
     return redirect(url_for('management.list_menus'))
\ No newline at end of file
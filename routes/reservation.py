@@ -0,0 +1,79 @@
+# routes/reservation.py
+
+"""
+Blueprint para as rotas de reserva de refeições ([US06], [US07]).
+
+A criação de reservas passa pela sala de espera virtual (utils/waiting_room.py),
+que limita quantas reservas por segundo chegam ao banco na abertura das reservas.
+
+As rotas que criam ou cancelam reservas aceitam uma chave de idempotência,
+para que reenvios do mesmo formulário (comuns em redes congestionadas) não
+criem reservas duplicadas nem cancelem duas vezes.
+"""
+
+from flask import Blueprint, redirect, url_for, flash
+from flask_login import login_required, current_user
+from datetime import date
+
+# Importações dos modelos e extensões
+from models.models import Menu, Reservation, ReservationStatus
+from extensions import db
+from utils.idempotency import idempotent
+from utils.waiting_room import waiting_room
+
+# Definição do Blueprint
+reservation_bp = Blueprint(
+    'reservation',
+    __name__,
+    template_folder='templates',
+    url_prefix='/reservas'
+)
+
+
+@reservation_bp.route('/menu/<int:menu_id>', methods=['POST'])
+@waiting_room
+@login_required
+@idempotent
+def make_reservation(menu_id):
+    """Cria uma reserva do usuário logado para o cardápio informado."""
+    menu = Menu.query.get_or_404(menu_id)
+
+    if menu.date < date.today():
+        flash('Não é possível reservar um cardápio de uma data passada.', 'danger')
+        return redirect(url_for('dashboard.index'))
+
+    # Validação: o usuário só pode ter uma reserva ativa por cardápio.
+    existing_reservation = Reservation.query.filter_by(
+        user_id=current_user.id, menu_id=menu.id, status=ReservationStatus.CONFIRMADA
+    ).first()
+    if existing_reservation:
+        flash('Você já possui uma reserva para este cardápio.', 'info')
+        return redirect(url_for('dashboard.my_reservations'))
+
+    new_reservation = Reservation(user_id=current_user.id, menu_id=menu.id)
+    db.session.add(new_reservation)
+    db.session.commit()
+    flash('Reserva realizada com sucesso!', 'success')
+    return redirect(url_for('dashboard.my_reservations'))
+
+
+@reservation_bp.route('/cancelar/<int:reservation_id>', methods=['POST'])
+@login_required
+@idempotent
+def cancel_reservation(reservation_id):
+    """Cancela uma reserva confirmada do usuário logado."""
+    reservation = Reservation.query.get_or_404(reservation_id)
+
+    # O usuário só pode cancelar as próprias reservas.
+    if reservation.user_id != current_user.id:
+        flash('Você não tem permissão para cancelar esta reserva.', 'danger')
+        return redirect(url_for('dashboard.my_reservations'))
+
+    if reservation.status != ReservationStatus.CONFIRMADA:
+        flash('Apenas reservas confirmadas podem ser canceladas.', 'danger')
+        return redirect(url_for('dashboard.my_reservations'))
+
+    reservation.status = ReservationStatus.CANCELADA
+    db.session.commit()
+    flash('Reserva cancelada com sucesso!', 'success')
+    return redirect(url_for('dashboard.my_reservations'))
@@ -0,0 +1,46 @@
+# routes/waiting_room.py
+
+"""
+Blueprint da sala de espera virtual das reservas.
+
+Estas rotas não usam @login_required nem acessam o banco: a senha da fila é assinada
+e já identifica o usuário e o cardápio, então atender as consultas de posição custa
+apenas a verificação da assinatura, mesmo no pico de acessos.
+"""
+
+from flask import Blueprint, render_template, request, jsonify, abort
+
+from utils.waiting_room import read_ticket, ticket_status
+
+# Definição do Blueprint
+waiting_room_bp = Blueprint(
+    'waiting_room',
+    __name__,
+    template_folder='templates',
+    url_prefix='/fila'
+)
+
+
+@waiting_room_bp.route('/espera')
+def wait():
+    """Página de espera que acompanha a posição na fila e reenvia a reserva ao ser admitido."""
+    ticket = request.args.get('ticket')
+    data = read_ticket(ticket)
+    if data is None:
+        abort(400)
+
+    # A chave de idempotência vem da própria senha, que é assinada.
+    return render_template('reservation/waiting_room.html', ticket=ticket, menu_id=data['m'],
+                           idempotency_key=data['k'], status=ticket_status(data))
+
+
+@waiting_room_bp.route('/status')
+def status():
+    """Retorna em JSON se a senha já pode entrar, a posição e o tempo estimado (em segundos)."""
+    data = read_ticket(request.args.get('ticket'))
+    if data is None:
+        return jsonify(error='Senha da fila inválida ou expirada.'), 400
+
+    response = jsonify(ticket_status(data))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
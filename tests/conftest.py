@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# Os testes usam um SQLite temporário; precisa ser definido antes de importar a configuração.
+_db_dir = tempfile.mkdtemp()
+os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+
+from app import create_app
+from extensions import db, bcrypt
+from models.models import User, Menu, MealType, UserRole
+
+PASSWORD = 'senha-de-teste'
+
+
+@pytest.fixture
+def app():
+    app = create_app('test')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def create_user(app, email='estudante@ifc.edu.br', role=UserRole.ESTUDANTE):
+    with app.app_context():
+        user = User(full_name='Usuário de Teste', email=email, role=role,
+                    password_hash=bcrypt.generate_password_hash(PASSWORD).decode('utf-8'))
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def create_menu(app, days_ahead=1, meal_type=MealType.ALMOCO):
+    with app.app_context():
+        menu = Menu(date=date.today() + timedelta(days=days_ahead), meal_type=meal_type)
+        db.session.add(menu)
+        db.session.commit()
+        return menu.id
+
+
+@pytest.fixture
+def user_id(app):
+    return create_user(app)
+
+
+@pytest.fixture
+def menu_id(app):
+    return create_menu(app)
+
+
+def login(client, email='estudante@ifc.edu.br', remember=False):
+    data = {'email': email, 'password': PASSWORD}
+    if remember:
+        data['remember'] = 'on'
+    response = client.post('/auth/login', data=data)
+    assert response.headers['Location'].endswith('/dashboard/')
+    return client
+
+
+def clone_client(app, client):
+    """Cria outro cliente com os mesmos cookies (ex: o mesmo celular reenviando requisições)."""
+    clone = app.test_client()
+    for cookie in client._cookies.values():
+        clone.set_cookie(cookie.key, cookie.value, domain=cookie.domain)
+    return clone
+
+
+@contextmanager
+def count_queries(app):
+    """Conta os comandos SQL executados no banco dentro do bloco."""
+    counter = {'total': 0, 'statements': []}
+    lock = threading.Lock()
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        with lock:
+            counter['total'] += 1
+            counter['statements'].append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,95 @@
+from flask import render_template
+
+from extensions import db
+from models.models import Dish, Menu, UserRole
+from utils.lru_cache import LRUCache
+from tests.conftest import create_user, create_menu, login
+
+
+def _manager_client(app):
+    create_user(app, email='nutri@ifc.edu.br', role=UserRole.NUTRICIONISTA)
+    return login(app.test_client(), email='nutri@ifc.edu.br')
+
+
+def _add_dish(app, menu_id, name):
+    with app.app_context():
+        dish = Dish(name=name)
+        menu = db.session.get(Menu, menu_id)
+        menu.dishes.append(dish)
+        db.session.commit()
+        return dish.id
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    cache.get('a')
+    cache.set('c', 3, ttl=60)
+    assert cache.get('a') == 1 and cache.get('b') is None and cache.get('c') == 3
+    cache.set('d', 4, ttl=-1)
+    assert cache.get('d') is None
+
+
+def test_menu_rows_are_served_from_cache(app):
+    menu_id = create_menu(app)
+    _add_dish(app, menu_id, 'Feijoada')
+    client = _manager_client(app)
+
+    first = client.get('/management/menus').get_data(as_text=True)
+    assert len(app.jinja_env.fragment_cache) == 1
+
+    with app.app_context():
+        # Mudança direta no banco, sem atualizar o carimbo: o fragmento em cache continua valendo.
+        db.session.execute(db.text("UPDATE dish SET name = 'Sem carimbo'"))
+        db.session.commit()
+    assert client.get('/management/menus').get_data(as_text=True) == first
+
+
+def test_dish_edit_invalidates_fragment_in_every_worker(app):
+    menu_id = create_menu(app)
+    dish_id = _add_dish(app, menu_id, 'Feijoada')
+    client = _manager_client(app)
+    assert 'Feijoada' in client.get('/management/menus').get_data(as_text=True)
+
+    # Outro "worker" (outra instância da aplicação) com o fragmento antigo em cache.
+    from app import create_app
+    other_worker = create_app('test')
+    other_client = login(other_worker.test_client(), email='nutri@ifc.edu.br')
+    assert 'Feijoada' in other_client.get('/management/menus').get_data(as_text=True)
+
+    client.post(f'/management/dishes/edit/{dish_id}', data={'name': 'Feijoada Vegana'})
+
+    assert 'Feijoada Vegana' in client.get('/management/menus').get_data(as_text=True)
+    assert 'Feijoada Vegana' in other_client.get('/management/menus').get_data(as_text=True)
+
+
+def test_menu_edit_invalidates_fragment(app):
+    menu_id = create_menu(app)
+    _add_dish(app, menu_id, 'Feijoada')
+    with app.app_context():
+        db.session.add(Dish(name='Lasanha'))
+        db.session.commit()
+        lasanha_id = Dish.query.filter_by(name='Lasanha').one().id
+        menu_date = db.session.get(Menu, menu_id).date.isoformat()
+    client = _manager_client(app)
+    client.get('/management/menus')
+
+    client.post(f'/management/menus/edit/{menu_id}',
+                data={'date': menu_date, 'meal_type': 'ALMOCO', 'dishes': [str(lasanha_id)]})
+
+    page = client.get('/management/menus').get_data(as_text=True)
+    assert 'Lasanha' in page and 'Feijoada' not in page
+
+
+def test_cached_render_matches_uncached(app):
+    for days in range(1, 4):
+        _add_dish(app, create_menu(app, days_ahead=days), f'Prato {days}')
+
+    with app.test_request_context(), app.app_context():
+        menus = Menu.query.order_by(Menu.date.desc()).all()
+        cached = render_template('management/list_menus.html', menus=menus)
+        again = render_template('management/list_menus.html', menus=menus)
+        app.jinja_env.fragment_cache = None
+        uncached = render_template('management/list_menus.html', menus=menus)
+    assert cached == again == uncached
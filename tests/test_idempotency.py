@@ -0,0 +1,189 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from config import config_by_name, TestingConfig
+from extensions import db
+from models.models import Reservation, ReservationStatus, IdempotencyKey
+from utils.idempotency import purge_expired_keys
+from tests.conftest import login, clone_client, count_queries, create_menu, create_user
+
+FLOOD_SIZE = 20
+
+
+class SingleConnectionConfig(TestingConfig):
+    SQLALCHEMY_ENGINE_OPTIONS = dict(pool_size=1, max_overflow=0, pool_timeout=1)
+
+
+config_by_name['test-single-connection'] = SingleConnectionConfig
+
+
+def _flood(app, client, url, headers_for):
+    """Envia FLOOD_SIZE POSTs simultâneos, cada um de um cliente com a mesma sessão."""
+    clients = [clone_client(app, client) for _ in range(FLOOD_SIZE)]
+    responses = [None] * FLOOD_SIZE
+    barrier = threading.Barrier(FLOOD_SIZE)
+
+    def send(i):
+        barrier.wait()
+        responses[i] = clients[i].post(url, headers=headers_for(i))
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(FLOOD_SIZE)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def _booking_statements(counter):
+    """Comandos ligados à lógica de reserva (sem contar o carregamento do usuário e da sessão)."""
+    tables = ('reservation', 'menu', 'idempotency_key')
+    return sum(1 for s in counter['statements'] if any(f' {t} ' in f' {s} ' or f'{t}.' in s for t in tables))
+
+
+def test_duplicate_flood_creates_one_reservation(app, user_id, menu_id):
+    client = login(app.test_client())
+    url = f'/reservas/menu/{menu_id}'
+
+    with count_queries(app) as with_key:
+        responses = _flood(app, client, url, lambda i: {'Idempotency-Key': 'flood-1'})
+
+    assert all(r.status_code == 302 for r in responses)
+    assert all(r.headers['Location'] == '/dashboard/minhas-reservas' for r in responses)
+    assert sum(1 for r in responses if r.headers.get('Idempotent-Replayed')) == FLOOD_SIZE - 1
+    with app.app_context():
+        assert Reservation.query.count() == 1
+        assert IdempotencyKey.query.count() == 1
+    reservation_inserts = [s for s in with_key['statements'] if s.startswith('INSERT INTO reservation')]
+    assert len(reservation_inserts) == 1
+
+    # O mesmo volume sem chave executa a lógica de reserva em todas as requisições.
+    with count_queries(app) as without_key:
+        for _ in range(FLOOD_SIZE):
+            client.post(url)
+
+    booking_with_key = _booking_statements(with_key)
+    booking_without_key = _booking_statements(without_key)
+    assert booking_with_key < booking_without_key / 4
+
+
+def test_retry_replays_stored_response_and_flash(app, user_id, menu_id):
+    client = login(app.test_client())
+    headers = {'Idempotency-Key': 'retry-1'}
+    first = client.post(f'/reservas/menu/{menu_id}', headers=headers)
+    client.get('/dashboard/minhas-reservas') # Consome a mensagem flash
+
+    with count_queries(app) as queries:
+        retry = client.post(f'/reservas/menu/{menu_id}', headers=headers)
+
+    assert retry.status_code == first.status_code
+    assert retry.headers['Location'] == first.headers['Location']
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert not any(s.startswith('INSERT INTO reservation') for s in queries['statements'])
+    assert 'Reserva realizada com sucesso!' in client.get('/dashboard/minhas-reservas').get_data(as_text=True)
+
+
+def test_cancellation_is_not_repeated(app, user_id, menu_id):
+    client = login(app.test_client())
+    client.post(f'/reservas/menu/{menu_id}')
+    with app.app_context():
+        reservation_id = Reservation.query.one().id
+
+    responses = _flood(app, client, f'/reservas/cancelar/{reservation_id}',
+                       lambda i: {'Idempotency-Key': 'cancel-1'})
+
+    assert all(r.status_code == 302 for r in responses)
+    with app.app_context():
+        assert db.session.get(Reservation, reservation_id).status == ReservationStatus.CANCELADA
+
+
+def test_key_reused_on_another_route_is_rejected(app, user_id, menu_id):
+    client = login(app.test_client())
+    client.post(f'/reservas/menu/{menu_id}', headers={'Idempotency-Key': 'same'})
+    with app.app_context():
+        reservation_id = Reservation.query.one().id
+
+    response = client.post(f'/reservas/cancelar/{reservation_id}', headers={'Idempotency-Key': 'same'})
+    assert response.status_code == 422
+
+
+def test_purge_removes_only_expired_keys(app, user_id, menu_id):
+    client = login(app.test_client())
+    client.post(f'/reservas/menu/{menu_id}', headers={'Idempotency-Key': 'old'})
+    client.post(f'/reservas/menu/{menu_id}', headers={'Idempotency-Key': 'new'})
+
+    with app.app_context():
+        old = IdempotencyKey.query.filter_by(key='old').one()
+        old.expires_at = old.created_at.replace(year=2000)
+        db.session.commit()
+        assert purge_expired_keys() == 1
+        assert [k.key for k in IdempotencyKey.query.all()] == ['new']
+
+
+def test_my_reservations_query_count_does_not_grow_with_rows(app, user_id):
+    client = login(app.test_client())
+
+    def count_page_queries():
+        with count_queries(app) as queries:
+            assert client.get('/dashboard/minhas-reservas').status_code == 200
+        return queries['total']
+
+    client.post(f'/reservas/menu/{create_menu(app, days_ahead=1)}')
+    with_one = count_page_queries()
+    for days in range(2, 7):
+        client.post(f'/reservas/menu/{create_menu(app, days_ahead=days)}')
+
+    assert count_page_queries() == with_one
+
+
+def _in_progress_key(app, user_id, key, path, age):
+    """Linha "em processamento" deixada por outro processo há age segundos."""
+    with app.app_context():
+        created_at = datetime.utcnow() - timedelta(seconds=age)
+        db.session.add(IdempotencyKey(user_id=user_id, key=key, request_path=path, created_at=created_at,
+                                      expires_at=created_at + app.config['IDEMPOTENCY_KEY_TTL']))
+        db.session.commit()
+
+
+def test_abandoned_key_is_taken_over(app, user_id, menu_id):
+    # O worker que reservou a chave morreu há uma hora, antes de guardar a resposta.
+    url = f'/reservas/menu/{menu_id}'
+    _in_progress_key(app, user_id, 'abandonada', url, age=3600)
+    client = login(app.test_client())
+
+    start = time.monotonic()
+    response = client.post(url, headers={'Idempotency-Key': 'abandonada'})
+
+    assert response.status_code == 302 and 'Idempotent-Replayed' not in response.headers
+    assert time.monotonic() - start < app.config['IDEMPOTENCY_WAIT_TIMEOUT'] / 2 # Não espera a trava
+    with app.app_context():
+        assert Reservation.query.count() == 1
+        assert IdempotencyKey.query.one().status_code == 302
+
+
+def test_waiting_for_another_process_does_not_hold_a_connection(app, menu_id):
+    # Pool de uma conexão: se a requisição em espera a segurasse, nenhuma outra seria atendida.
+    small_pool = create_app('test-single-connection')
+    small_pool.config['PROPAGATE_EXCEPTIONS'] = False
+    user_id = create_user(small_pool)
+    url = f'/reservas/menu/{menu_id}'
+    _in_progress_key(small_pool, user_id, 'em-andamento', url, age=0)
+    client = login(small_pool.test_client())
+
+    retry = {}
+    waiting = threading.Thread(target=lambda: retry.update(
+        response=clone_client(small_pool, client).post(url, headers={'Idempotency-Key': 'em-andamento'})))
+    waiting.start()
+    time.sleep(0.3)
+    assert client.get('/dashboard/minhas-reservas').status_code == 200
+
+    # O outro processo termina e guarda a resposta; o reenvio em espera a reaproveita.
+    with small_pool.app_context():
+        record = IdempotencyKey.query.one()
+        record.status_code, record.location = 302, '/dashboard/minhas-reservas'
+        db.session.commit()
+    waiting.join()
+    assert retry['response'].status_code == 302
+    assert retry['response'].headers['Idempotent-Replayed'] == 'true'
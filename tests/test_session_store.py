@@ -0,0 +1,200 @@
+import threading
+from datetime import datetime, timedelta
+
+from app import create_app
+from config import config_by_name, TestingConfig
+from extensions import db
+from models.models import User, UserRole, UserSession, SessionInvalidation
+from utils import session_store
+from utils.waiting_room import issue_ticket
+from tests.conftest import create_user, create_menu, login, clone_client, count_queries
+
+REMEMBER_COOKIE = 'remember_token'
+
+
+class SmallPoolConfig(TestingConfig):
+    SQLALCHEMY_ENGINE_OPTIONS = dict(pool_size=2, max_overflow=0, pool_timeout=2)
+
+
+config_by_name['test-small-pool'] = SmallPoolConfig
+
+
+def _session_cookie(app, client):
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    return cookie.value if cookie else None
+
+
+def _logged_in(client):
+    return client.get('/dashboard/minhas-reservas').status_code == 200
+
+
+def _other_worker(app, client, invalidation_check_interval=0):
+    """Outra instância da aplicação (outro processo) com os mesmos cookies do cliente."""
+    other = create_app('test')
+    other.config['SESSION_INVALIDATION_CHECK_INTERVAL'] = invalidation_check_interval
+    other.session_interface.store.invalidation_check_interval = invalidation_check_interval
+    return other, clone_client(other, client)
+
+
+def test_logout_is_not_undone_by_a_stale_cache(app, user_id, menu_id):
+    client = login(app.test_client())
+    # Processo que só voltaria a conferir as invalidações bem depois do logout.
+    other, other_client = _other_worker(app, client, invalidation_check_interval=3600)
+    assert _logged_in(other_client) # A sessão fica no cache do outro processo
+
+    client.get('/auth/logout')
+
+    # A gravação da sessão em cache não recria a linha removida e apaga o cookie.
+    response = other_client.post(f'/reservas/menu/{menu_id}')
+    assert 'Set-Cookie' in response.headers and _session_cookie(other, other_client) is None
+    with app.app_context():
+        assert UserSession.query.filter(UserSession.user_id.isnot(None)).count() == 0
+    assert not _logged_in(client)
+
+
+def test_logout_is_seen_by_other_workers(app, user_id):
+    client = login(app.test_client())
+    other, other_client = _other_worker(app, client)
+    assert _logged_in(other_client)
+
+    client.get('/auth/logout')
+
+    assert not _logged_in(other_client)
+
+
+def test_change_on_one_worker_is_seen_by_the_others(app, user_id, menu_id):
+    client = login(app.test_client())
+    client.get('/dashboard/minhas-reservas') # Consome a mensagem de boas-vindas
+    other, other_client = _other_worker(app, client)
+    assert _logged_in(other_client) # A sessão fica no cache do outro processo
+
+    client.post(f'/reservas/menu/{menu_id}') # Grava a mensagem flash na sessão
+
+    assert 'Reserva realizada com sucesso!' in other_client.get('/dashboard/minhas-reservas').get_data(as_text=True)
+
+
+def _session_reads(queries):
+    return [s for s in queries['statements'] if 'FROM user_session' in s and 'user_session.id =' in s]
+
+
+def test_checks_keep_current_entries_in_the_cache(app, user_id, menu_id):
+    create_user(app, email='outro@ifc.edu.br')
+    client = login(app.test_client())
+    login(app.test_client(), email='outro@ifc.edu.br').get('/auth/logout') # Remoção já registrada
+
+    # A sessão gravada por este processo continua no cache mesmo com as consultas às
+    # alterações rodando a cada requisição, e a remoção já aplicada não é aplicada de novo.
+    client.post(f'/reservas/menu/{menu_id}')
+    with count_queries(app) as queries:
+        for _ in range(3):
+            assert _logged_in(client)
+    assert _session_reads(queries) == []
+
+
+def test_session_id_is_rotated_on_login(app, user_id):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'estudante@ifc.edu.br', 'password': 'errada'})
+    planted = _session_cookie(app, client) # Id conhecido antes do login (ex: fixado por um atacante)
+    assert planted
+
+    login(client)
+    assert _session_cookie(app, client) != planted
+    attacker = app.test_client()
+    attacker.set_cookie(app.config['SESSION_COOKIE_NAME'], planted)
+    assert not _logged_in(attacker)
+    assert _logged_in(client)
+
+
+def test_remember_me_is_revoked_with_the_role(app, user_id):
+    create_user(app, email='nutricionista@ifc.edu.br', role=UserRole.NUTRICIONISTA)
+    client = login(app.test_client(), remember=True)
+    other = login(app.test_client(), email='nutricionista@ifc.edu.br', remember=True)
+    remember = client.get_cookie(REMEMBER_COOKIE).value
+
+    def from_remember_cookie():
+        browser = app.test_client() # Navegador reaberto: só o cookie "lembrar de mim"
+        browser.set_cookie(REMEMBER_COOKIE, remember)
+        return browser
+
+    assert _logged_in(from_remember_cookie())
+
+    with app.app_context():
+        assert session_store.revoke_role_sessions(app, UserRole.ESTUDANTE) >= 1
+        assert db.session.get(User, user_id).session_version == 2
+
+    browser = from_remember_cookie()
+    assert not _logged_in(browser)
+    assert browser.get_cookie(REMEMBER_COOKIE) is None # Cookie revogado é apagado
+    assert not _logged_in(client)
+    assert _logged_in(other) # Outros perfis não são afetados
+
+
+def test_waiting_room_polling_does_not_load_the_session(app, user_id, menu_id):
+    client = login(app.test_client())
+    with app.test_request_context():
+        ticket = issue_ticket(user_id, menu_id, 'ALMOCO', 0, 'chave')
+
+    # Processo recém-iniciado, sem nada em cache: nem a sessão nem o usuário são carregados.
+    other, other_client = _other_worker(app, client)
+    with count_queries(other) as queries:
+        assert other_client.get('/fila/status', query_string={'ticket': ticket}).status_code == 200
+        assert other_client.get('/fila/espera', query_string={'ticket': ticket}).status_code == 200
+    assert queries['total'] == 0
+
+
+def test_cached_session_is_a_copy(app):
+    store = app.session_interface.store
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    with app.app_context():
+        store.save('sid', None, {'_flashes': [('info', 'Olá')]}, expires_at, new=True)
+        data, _ = store.load('sid')
+        data['_flashes'].append(('info', 'Alterado'))
+        assert store.load('sid')[0] == {'_flashes': [('info', 'Olá')]}
+        # Uma sessão que não existe mais não é recriada.
+        store.delete('sid')
+        assert store.save('sid', None, data, expires_at, new=False) is False
+        assert store.load('sid') is None
+
+
+def test_purge_removes_expired_sessions_in_batches(app, user_id):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all(UserSession(id=f'expirada-{i}', data='{}', expires_at=now - timedelta(days=1))
+                           for i in range(5))
+        db.session.add(UserSession(id='valida', user_id=user_id, data='{}', expires_at=now + timedelta(days=1)))
+        db.session.add(SessionInvalidation(session_id='antiga', invalidated_at=now - timedelta(days=1)))
+        db.session.commit()
+
+        app.config['SESSION_PURGE_BATCH_SIZE'] = 2
+        assert session_store.purge_expired_sessions(app) == 5
+        assert [s.id for s in UserSession.query.all()] == ['valida']
+        assert SessionInvalidation.query.count() == 0
+
+
+def test_concurrent_session_writes_do_not_exhaust_the_pool(app):
+    # A página lê o banco e consome a mensagem flash, então grava a sessão no fim da requisição.
+    # Se a conexão da db.session continuasse presa nesse momento, requisições simultâneas em um
+    # pool de duas conexões esperariam umas pelas outras até o timeout.
+    small_pool = create_app('test-small-pool')
+    small_pool.config['PROPAGATE_EXCEPTIONS'] = False
+    clients = []
+    for i in range(6):
+        email = f'usuario{i}@ifc.edu.br'
+        create_user(small_pool, email=email)
+        client = login(small_pool.test_client(), email=email)
+        client.post(f'/reservas/menu/{create_menu(small_pool, days_ahead=i + 1)}')
+        clients.append(client)
+
+    statuses = []
+    barrier = threading.Barrier(len(clients))
+
+    def read_reservations(client):
+        barrier.wait()
+        statuses.append(client.get('/dashboard/minhas-reservas').status_code)
+
+    threads = [threading.Thread(target=read_reservations, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * len(clients)
@@ -0,0 +1,156 @@
+import time
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from app import create_app
+from extensions import db
+from models.models import Reservation, Menu, MealType
+from utils.waiting_room import TokenBucket, read_ticket, _get_meal_type
+from tests.conftest import create_user, login, count_queries
+
+
+@pytest.fixture
+def app(app):
+    app.config.update(
+        WAITING_ROOM_ENABLED=True,
+        WAITING_ROOM_RATES=dict(ALMOCO=20, JANTA=20),
+        WAITING_ROOM_BURST=1,
+        WAITING_ROOM_WORKERS=1,
+    )
+    return app
+
+
+def _ticket_from(response):
+    assert response.status_code == 303
+    return parse_qs(urlparse(response.headers['Location']).query)['ticket'][0]
+
+
+def _read_ticket(app, ticket):
+    with app.app_context():
+        return read_ticket(ticket)
+
+
+def _user_client(app, number):
+    email = f'usuario{number}@ifc.edu.br'
+    create_user(app, email=email)
+    return login(app.test_client(), email=email)
+
+
+def test_token_bucket_releases_burst_then_rate():
+    bucket = TokenBucket(rate=10, burst=3)
+    admitted_at = [bucket.reserve(now=100.0) for _ in range(5)]
+    assert admitted_at[:3] == [100.0, 100.0, 100.0]
+    assert admitted_at[3:] == pytest.approx([100.1, 100.2])
+
+
+def test_rate_and_burst_are_split_between_workers(app, user_id, menu_id):
+    app.config.update(WAITING_ROOM_RATES=dict(ALMOCO=40, JANTA=40), WAITING_ROOM_BURST=8, WAITING_ROOM_WORKERS=4)
+    from utils.waiting_room import _get_bucket
+    with app.app_context():
+        bucket = _get_bucket('ALMOCO')
+    assert bucket.interval == pytest.approx(1 / 10)
+    assert bucket.tolerance == pytest.approx(1 / 10) # Rajada de 2 por worker
+
+
+def test_arrival_without_slot_is_queued_and_polled_without_db(app, menu_id):
+    app.config.update(WAITING_ROOM_RATES=dict(ALMOCO=1, JANTA=1))
+    first = _user_client(app, 1)
+    second = _user_client(app, 2)
+
+    assert first.post(f'/reservas/menu/{menu_id}').status_code == 302
+    ticket = _ticket_from(second.post(f'/reservas/menu/{menu_id}'))
+
+    poller = app.test_client() # O ticket basta; a consulta não depende do login
+    with count_queries(app) as queries:
+        status = poller.get('/fila/status', query_string={'ticket': ticket}).get_json()
+        page = poller.get('/fila/espera', query_string={'ticket': ticket})
+    assert queries['total'] == 0
+    assert status['admitted'] is False and status['position'] >= 1
+    assert page.status_code == 200
+
+    assert poller.get('/fila/status', query_string={'ticket': 'invalida'}).status_code == 400
+
+
+def test_completed_retry_is_replayed_without_spending_a_slot(app, menu_id):
+    app.config.update(WAITING_ROOM_RATES=dict(ALMOCO=0.01, JANTA=0.01), WAITING_ROOM_BURST=2)
+    first = _user_client(app, 1)
+    second = _user_client(app, 2)
+    third = _user_client(app, 3)
+    headers = {'Idempotency-Key': 'reserva-1'}
+
+    assert first.post(f'/reservas/menu/{menu_id}', headers=headers).status_code == 302
+    for _ in range(3):
+        retry = first.post(f'/reservas/menu/{menu_id}', headers=headers)
+        assert retry.status_code == 302
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+
+    # Os reenvios não gastaram a segunda vaga da rajada.
+    assert second.post(f'/reservas/menu/{menu_id}').status_code == 302
+    assert third.post(f'/reservas/menu/{menu_id}').status_code == 303
+
+
+def test_admitted_ticket_is_single_use(app, menu_id):
+    # Taxa baixa para que a próxima vaga ainda esteja distante quando a senha for reusada.
+    app.config.update(WAITING_ROOM_RATES=dict(ALMOCO=2, JANTA=2))
+    first = _user_client(app, 1)
+    second = _user_client(app, 2)
+    first.post(f'/reservas/menu/{menu_id}')
+
+    ticket = _ticket_from(second.post(f'/reservas/menu/{menu_id}'))
+    data = _read_ticket(app, ticket)
+    assert data['k'] # A fila gera uma chave quando o formulário não envia uma
+
+    # Antes da hora, a senha leva de volta à página de espera.
+    early = second.post(f'/reservas/menu/{menu_id}', data={'queue_ticket': ticket, 'idempotency_key': data['k']})
+    assert _ticket_from(early) == ticket
+
+    time.sleep(max(0, data['a'] - time.time()) + 0.01)
+    form = {'queue_ticket': ticket, 'idempotency_key': data['k']}
+    assert second.post(f'/reservas/menu/{menu_id}', data=form).status_code == 302
+
+    # Reusar a senha devolve a resposta guardada em vez de executar a rota de novo.
+    reuse = second.post(f'/reservas/menu/{menu_id}', data=form)
+    assert reuse.headers['Idempotent-Replayed'] == 'true'
+    # Com outra chave, a senha não vale e a requisição volta para a fila.
+    other_key = second.post(f'/reservas/menu/{menu_id}', data={'queue_ticket': ticket, 'idempotency_key': 'outra'})
+    assert other_key.status_code == 303
+
+    with app.app_context():
+        assert Reservation.query.count() == 2
+
+
+def test_retry_while_queued_keeps_the_same_ticket(app, menu_id):
+    app.config.update(WAITING_ROOM_RATES=dict(ALMOCO=1, JANTA=1))
+    first = _user_client(app, 1)
+    second = _user_client(app, 2)
+    third = _user_client(app, 3)
+    assert first.post(f'/reservas/menu/{menu_id}').status_code == 302
+
+    # O navegador repete o POST sem a senha, como numa rede instável.
+    headers = {'Idempotency-Key': 'same'}
+    tickets = [_ticket_from(second.post(f'/reservas/menu/{menu_id}', headers=headers)) for _ in range(5)]
+    assert len(set(tickets)) == 1
+
+    # Os reenvios não gastaram vagas: o próximo usuário fica logo atrás.
+    queued = _read_ticket(app, tickets[0])
+    behind = _read_ticket(app, _ticket_from(third.post(f'/reservas/menu/{menu_id}')))
+    assert behind['a'] == pytest.approx(queued['a'] + 1, abs=0.01)
+
+
+def test_meal_type_cache_expires_on_other_workers(app, menu_id):
+    other = create_app('test')
+    other.config['WAITING_ROOM_MEAL_TYPE_TTL'] = 0.1
+    with other.app_context():
+        assert _get_meal_type(menu_id) == 'ALMOCO'
+
+    # Edição feita em outro worker: o sinal menu_changed não chega a este processo.
+    with app.app_context():
+        db.session.get(Menu, menu_id).meal_type = MealType.JANTA
+        db.session.commit()
+    with other.app_context():
+        assert _get_meal_type(menu_id) == 'ALMOCO'
+
+    time.sleep(0.15)
+    with other.app_context():
+        assert _get_meal_type(menu_id) == 'JANTA'
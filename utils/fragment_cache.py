@@ -0,0 +1,63 @@
+"""
+Cache de fragmentos de templates Jinja.
+
+Trechos caros de renderizar (como os laços sobre menu.dishes) podem ser guardados já
+renderizados com a tag:
+
+    {% cache menu_cache_key(menu), 600 %} ... {% endcache %}
+
+O primeiro argumento é a chave do fragmento e o segundo, opcional, a validade em
+segundos (o padrão é FRAGMENT_CACHE_TTL). Os fragmentos ficam em um LRU limitado a
+FRAGMENT_CACHE_SIZE entradas.
+
+As chaves dos cardápios usam os carimbos updated_at de Menu e Dish, gravados no banco
+a cada alteração. Assim todos os workers passam a usar a nova versão assim que leem o
+cardápio alterado, sem depender de sinais entre processos, e um id reaproveitado nunca
+recebe o fragmento de um cardápio removido.
+"""
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class FragmentCacheExtension(Extension):
+    """Extensão Jinja que adiciona a tag {% cache chave[, validade] %}...{% endcache %}."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        # Configurados pela aplicação em create_app
+        environment.extend(fragment_cache=None, fragment_cache_ttl=3600)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        # O nome do template e a linha entram na chave para que a mesma chave
+        # possa ser usada em tags diferentes sem colisão.
+        args = [nodes.Const(parser.name), nodes.Const(lineno), parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_cache_support', args), [], [], body
+        ).set_lineno(lineno)
+
+    def _cache_support(self, template_name, lineno, key, ttl, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+
+        full_key = (template_name, lineno, key)
+        fragment = cache.get(full_key)
+        if fragment is None:
+            fragment = caller()
+            cache.set(full_key, fragment, ttl or self.environment.fragment_cache_ttl)
+        return fragment
+
+
+def menu_cache_key(menu):
+    """Chave de fragmento de um cardápio, que muda quando o cardápio ou algum de seus pratos muda."""
+    return ('menu', menu.id, menu.updated_at, tuple((dish.id, dish.updated_at) for dish in menu.dishes))
@@ -0,0 +1,278 @@
+"""
+Chaves de idempotência para as rotas que alteram estado (reservas e cancelamentos).
+
+O cliente envia uma chave única por ação, no cabeçalho 'Idempotency-Key' ou no campo
+de formulário 'idempotency_key'. A primeira requisição com a chave executa a rota e
+guarda a resposta na tabela IdempotencyKey; os reenvios com a mesma chave recebem a
+resposta guardada sem executar a lógica da rota novamente.
+
+Requisições duplicadas que chegam enquanto a original ainda está em andamento são
+agrupadas: no mesmo processo elas esperam a original terminar (sem tocar no banco) e,
+entre processos diferentes, a linha "em processamento" no banco funciona como trava.
+Essa trava vale por IDEMPOTENCY_LEASE_TIMEOUT segundos: se o processo dono da chave
+morrer no meio da requisição, o próximo reenvio assume a chave e executa a rota.
+"""
+
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, current_app, session, flash, make_response, abort
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+# Últimas chaves concluídas, guardadas na sessão para que replay_completed evite o banco
+COMPLETED_KEYS_SESSION_FIELD = '_idempotency_done'
+MAX_COMPLETED_KEYS = 10
+# Intervalo de consulta ao banco enquanto outro processo executa a mesma chave
+POLL_INTERVAL = 0.05
+
+
+class _InFlight:
+    """Requisição em andamento neste processo; as duplicadas esperam pelo resultado dela."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None # Resposta guardada (dict) ou None se a original falhou
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def idempotent(f):
+    """
+    Decorador que torna uma rota POST idempotente para o usuário logado.
+    Deve ser aplicado depois do @login_required. Sem chave, a rota executa normalmente.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request_idempotency_key()
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            abort(400)
+
+        slot_id = (current_user.id, key)
+        timeout = current_app.config['IDEMPOTENCY_WAIT_TIMEOUT']
+
+        while True:
+            with _in_flight_lock:
+                slot = _in_flight.get(slot_id)
+                is_leader = slot is None
+                if is_leader:
+                    slot = _in_flight[slot_id] = _InFlight()
+
+            if not is_leader:
+                # Outra thread já está executando esta chave: espera e reaproveita a resposta.
+                # A conexão da requisição volta ao pool durante a espera, para que um
+                # surto de duplicadas não esgote o pool enquanto a original executa.
+                db.session.close()
+                if not slot.done.wait(timeout):
+                    abort(409)
+                if slot.result is not None:
+                    return _replay(slot.result)
+                # A original falhou sem guardar resposta; tenta executar novamente.
+                continue
+
+            try:
+                response, slot.result = _execute(key, f, args, kwargs)
+            finally:
+                with _in_flight_lock:
+                    _in_flight.pop(slot_id, None)
+                slot.done.set()
+            return response
+
+    return decorated_function
+
+
+def request_idempotency_key():
+    """Retorna a chave de idempotência enviada na requisição (cabeçalho ou formulário), se houver."""
+    return request.headers.get(IDEMPOTENCY_HEADER) or request.form.get(IDEMPOTENCY_FORM_FIELD)
+
+
+def replay_completed(user_id):
+    """
+    Se a chave da requisição já tem uma resposta guardada para esta rota, devolve essa
+    resposta; caso contrário retorna None. Permite que camadas anteriores à rota (como a
+    sala de espera) atendam reenvios sem gastar recursos com eles.
+
+    O banco só é consultado se a chave estiver entre as concluídas registradas na sessão
+    do usuário, então requisições que não são reenvios não custam nenhuma consulta.
+    """
+    key = request_idempotency_key()
+    if not key or key not in session.get(COMPLETED_KEYS_SESSION_FIELD, []):
+        return None
+    record = db.session.get(IdempotencyKey, (user_id, key))
+    if record is None or record.status_code is None or record.request_path != request.path \
+            or record.expires_at < datetime.utcnow():
+        return None
+    return _replay(_to_dict(record))
+
+
+def _execute(key, f, args, kwargs):
+    """
+    Executa a rota como dona da chave, ou devolve a resposta já guardada no banco.
+    Retorna a resposta HTTP e o dicionário guardado (None se nada foi guardado).
+    """
+    user_id = current_user.id
+    deadline = time.monotonic() + current_app.config['IDEMPOTENCY_WAIT_TIMEOUT']
+    lease = timedelta(seconds=current_app.config['IDEMPOTENCY_LEASE_TIMEOUT'])
+
+    while True:
+        record = db.session.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        now = datetime.utcnow()
+
+        if record is not None and record.expires_at < now:
+            # Chave expirada que a limpeza ainda não removeu: pode ser reutilizada.
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+
+        if record is not None:
+            if record.request_path != request.path:
+                # A mesma chave não pode ser usada para ações diferentes.
+                abort(422)
+            if record.status_code is None:
+                if record.created_at < now - lease:
+                    # O processo dono da chave morreu no meio da requisição: assume a chave.
+                    if _take_over(user_id, key, record.created_at, now):
+                        break
+                    continue
+                # Outro processo está executando esta chave; espera o resultado dele.
+                stored = _wait_for_other_process(user_id, key, deadline, lease)
+                if stored is None:
+                    # A chave foi liberada ou abandonada; avalia de novo.
+                    continue
+                return _replay(stored), stored
+            stored = _to_dict(record)
+            return _replay(stored), stored
+
+        # Reserva a chave antes de executar a rota. A chave primária garante que
+        # apenas um processo consiga inserir a linha.
+        record = IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            request_path=request.path,
+            expires_at=now + current_app.config['IDEMPOTENCY_KEY_TTL']
+        )
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            continue
+        break
+
+    flashes_before = len(session.get('_flashes', []))
+    try:
+        response = make_response(f(*args, **kwargs))
+    except Exception:
+        db.session.rollback()
+        _release(user_id, key)
+        raise
+
+    if response.status_code >= 500:
+        # Erros do servidor não são guardados, para que o cliente possa tentar de novo.
+        _release(user_id, key)
+        return response, None
+
+    record = db.session.get(IdempotencyKey, (user_id, key))
+    record.status_code = response.status_code
+    record.location = response.headers.get('Location')
+    # Redirecionamentos são reconstruídos a partir do Location; não é preciso guardar o corpo.
+    if not response.is_streamed and not 300 <= response.status_code < 400:
+        record.body = response.get_data(as_text=True)
+    new_flashes = session.get('_flashes', [])[flashes_before:]
+    if new_flashes:
+        record.flashes = json.dumps(new_flashes)
+    stored = _to_dict(record)
+    db.session.commit()
+    completed_keys = session.get(COMPLETED_KEYS_SESSION_FIELD, [])
+    session[COMPLETED_KEYS_SESSION_FIELD] = (completed_keys + [key])[-MAX_COMPLETED_KEYS:]
+    return response, stored
+
+
+def _wait_for_other_process(user_id, key, deadline, lease):
+    """
+    Consulta o banco até a outra requisição guardar a resposta (retorna o dicionário
+    guardado) ou liberar ou abandonar a chave (retorna None). Responde 409 se o tempo acabar.
+    """
+    while time.monotonic() < deadline:
+        # A conexão volta ao pool durante a espera, como no agrupamento dentro do processo.
+        db.session.close()
+        time.sleep(POLL_INTERVAL)
+        record = db.session.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        if record is None or record.created_at < datetime.utcnow() - lease:
+            return None
+        if record.status_code is not None:
+            return _to_dict(record)
+    abort(409)
+
+
+def _take_over(user_id, key, created_at, now):
+    """
+    Assume uma chave abandonada, renovando a trava. O UPDATE só vale se a linha ainda for a
+    mesma que foi lida, então apenas um dos reenvios simultâneos consegue assumi-la.
+    """
+    taken = IdempotencyKey.query.filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key,
+        IdempotencyKey.status_code.is_(None),
+        IdempotencyKey.created_at == created_at,
+    ).update({
+        'created_at': now,
+        'expires_at': now + current_app.config['IDEMPOTENCY_KEY_TTL'],
+    }, synchronize_session=False)
+    db.session.commit()
+    return taken == 1
+
+
+def _release(user_id, key):
+    """Remove a reserva de uma chave cuja execução não produziu resposta guardável."""
+    IdempotencyKey.query.filter_by(user_id=user_id, key=key).delete()
+    db.session.commit()
+
+
+def _to_dict(record):
+    """Copia os dados da resposta para um dicionário que pode ser compartilhado entre threads."""
+    return {
+        'status_code': record.status_code,
+        'location': record.location,
+        'body': record.body or '',
+        'flashes': json.loads(record.flashes) if record.flashes else [],
+    }
+
+
+def _replay(stored):
+    """Reconstrói a resposta guardada, repetindo as mensagens flash da requisição original."""
+    for category, message in stored['flashes']:
+        flash(message, category)
+    response = make_response(stored['body'], stored['status_code'])
+    if stored['location']:
+        response.headers['Location'] = stored['location']
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def new_idempotency_key():
+    """Gera uma chave nova, usada nos formulários para identificar cada envio."""
+    return uuid.uuid4().hex
+
+
+def purge_expired_keys():
+    """Remove do banco as chaves cuja validade já expirou. Retorna quantas foram removidas."""
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,405 @@
+"""
+Sessões guardadas no servidor.
+
+Por padrão o Flask guarda a sessão inteira (login do Flask-Login, mensagens flash) em
+um cookie assinado, que é serializado, assinado e reenviado em toda resposta. Aqui o
+cookie leva apenas um id opaco e assinado; o conteúdo fica em um SessionStore e só é
+gravado quando muda.
+
+O armazenamento padrão (DatabaseSessionStore) usa a tabela UserSession, com um cache
+de leitura em memória de curta duração (SESSION_CACHE_TTL). Para compartilhar as
+sessões em outro serviço (ex: Redis), basta implementar um novo SessionStore.
+
+A cada SESSION_INVALIDATION_CHECK_INTERVAL segundos, cada processo tira do seu cache as
+sessões alteradas em outros processos (pela coluna updated_at de UserSession) e as
+removidas (registradas em SessionInvalidation). Uma sessão removida nunca é recriada:
+a gravação de uma sessão existente só atualiza a linha, e se ela não existe mais o
+cookie é apagado.
+
+O id da sessão é trocado no login, para que um id obtido antes do login (session
+fixation) não dê acesso à conta, e no logout, para que a sessão logada deixe de existir
+mesmo que um processo com o cache desatualizado tente gravá-la. A revogação das sessões
+de um usuário ou de um perfil também incrementa User.session_version, que faz parte do
+id guardado pelo Flask-Login, então o cookie "lembrar de mim" deixa de valer junto com
+as sessões.
+
+Comparado ao cookie assinado, ler a sessão não custa nada a mais quando ela está no
+cache, mas cada gravação custa um comando SQL (INSERT ou UPDATE) a mais.
+"""
+
+import copy
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+from flask import session
+from flask.sessions import SessionInterface, SecureCookieSession, session_json_serializer
+from flask_login import user_logged_in, user_loaded_from_cookie, user_logged_out
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import select, update, delete, insert, func
+from werkzeug.exceptions import HTTPException
+
+from extensions import db
+from models.models import User, UserSession, SessionInvalidation
+from utils.lru_cache import LRUCache
+
+# Quantos registros de invalidação anteriores ao último lido são consultados de novo:
+# transações concorrentes podem confirmar ids fora de ordem.
+INVALIDATION_OVERLAP = 100
+# Folga na consulta às sessões alteradas, para transações confirmadas depois do horário
+# gravado em updated_at e para pequenas diferenças entre os relógios dos servidores.
+CHANGE_MARGIN = timedelta(seconds=5)
+
+
+class ServerSideSession(SecureCookieSession):
+    """Sessão cujo conteúdo fica no servidor, identificada pelo atributo sid."""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        super().__init__(initial)
+        self.new = sid is None
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.expires_at = expires_at
+        self.previous_sid = None # Id substituído por regenerate(), removido ao gravar
+
+    def regenerate(self):
+        """Troca o id da sessão, mantendo o conteúdo. A sessão com o id anterior é removida ao gravar."""
+        if not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+class NullServerSideSession(ServerSideSession):
+    """Sessão vazia das rotas que não carregam a sessão (SESSION_SKIP_BLUEPRINTS); nunca é gravada."""
+
+
+class SessionStore(ABC):
+    """Interface dos armazenamentos de sessão. O conteúdo das sessões é um dict."""
+
+    @abstractmethod
+    def load(self, sid):
+        """Retorna (dados, expires_at) da sessão, ou None se não existir ou tiver expirado."""
+
+    @abstractmethod
+    def save(self, sid, user_id, data, expires_at, new):
+        """
+        Cria a sessão (new=True) ou atualiza uma existente. Uma sessão que não existe mais
+        não é recriada: nesse caso retorna False.
+        """
+
+    @abstractmethod
+    def delete(self, sid):
+        """Remove a sessão."""
+
+    @abstractmethod
+    def revoke_users(self, user_ids):
+        """Remove todas as sessões dos usuários informados. Retorna quantas foram removidas."""
+
+    @abstractmethod
+    def purge_expired(self, batch_size):
+        """Remove as sessões expiradas em lotes. Retorna quantas foram removidas."""
+
+
+class DatabaseSessionStore(SessionStore):
+    """
+    Guarda as sessões na tabela UserSession. Usa conexões próprias (SQLAlchemy Core),
+    para não interferir na transação da db.session usada pelas rotas.
+    """
+
+    serializer = session_json_serializer
+
+    def __init__(self, cache_size, cache_ttl, invalidation_check_interval):
+        # Cada entrada do cache é (dados, expires_at, updated_at da linha lida ou gravada).
+        self.cache = LRUCache(cache_size)
+        self.cache_ttl = cache_ttl
+        self.invalidation_check_interval = invalidation_check_interval
+        self.table = UserSession.__table__
+        self.invalidations = SessionInvalidation.__table__
+        self._lock = threading.Lock()
+        self._next_check = 0.0 # time.monotonic() da próxima consulta às alterações
+        self._checked_at = None # datetime.utcnow() da última consulta às alterações
+        self._last_invalidation = None # Maior id de SessionInvalidation já lido
+        self._applied = set() # Ids de SessionInvalidation já aplicados (ou gravados por este processo)
+        self._generation = 0 # Incrementado sempre que remoções são aplicadas ao cache
+
+    def load(self, sid):
+        self._check_invalidations()
+        item = self.cache.get(sid)
+        if item is None:
+            generation = self._generation
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    select(self.table.c.data, self.table.c.expires_at, self.table.c.updated_at)
+                    .where(self.table.c.id == sid)
+                ).first()
+            if row is None:
+                return None
+            item = (self.serializer.loads(row.data), row.expires_at, row.updated_at)
+            # Se uma remoção foi aplicada durante a leitura, a linha lida pode já não existir.
+            if generation == self._generation:
+                self.cache.set(sid, item, self.cache_ttl)
+
+        data, expires_at, _ = item
+        if expires_at < datetime.utcnow():
+            return None
+        # O cache guarda o dict já decodificado; cada requisição recebe a sua cópia.
+        return copy.deepcopy(data), expires_at
+
+    def save(self, sid, user_id, data, expires_at, new):
+        now = datetime.utcnow()
+        values = dict(user_id=user_id, data=self.serializer.dumps(data), expires_at=expires_at, updated_at=now)
+        with db.engine.begin() as conn:
+            if new:
+                conn.execute(insert(self.table).values(id=sid, **values))
+            elif conn.execute(update(self.table).where(self.table.c.id == sid).values(**values)).rowcount == 0:
+                self.cache.delete(sid)
+                return False
+        # Com o mesmo updated_at da linha, a consulta às alterações não descarta esta entrada.
+        self.cache.set(sid, (copy.deepcopy(data), expires_at, now), self.cache_ttl)
+        return True
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            if conn.execute(delete(self.table).where(self.table.c.id == sid)).rowcount:
+                self._log_removals(conn, [sid])
+        self.cache.delete(sid)
+
+    def revoke_users(self, user_ids):
+        with db.engine.begin() as conn:
+            sids = conn.execute(
+                delete(self.table)
+                .where(self.table.c.user_id.in_(user_ids))
+                .returning(self.table.c.id)
+            ).scalars().all()
+            if sids:
+                self._log_removals(conn, sids)
+        for sid in sids:
+            self.cache.delete(sid)
+        return len(sids)
+
+    def _log_removals(self, conn, sids):
+        ids = conn.execute(
+            insert(self.invalidations).returning(self.invalidations.c.id),
+            [dict(session_id=sid) for sid in sids]
+        ).scalars().all()
+        # Este processo já tirou as sessões do cache; não precisa aplicar os registros de novo.
+        with self._lock:
+            self._applied.update(ids)
+
+    def purge_expired(self, batch_size):
+        now = datetime.utcnow()
+        total = self._delete_in_batches(self.table, self.table.c.expires_at < now, batch_size)
+        # Depois de SESSION_CACHE_TTL nenhum cache guarda mais as sessões removidas antes disso.
+        cutoff = now - timedelta(seconds=2 * self.cache_ttl)
+        self._delete_in_batches(self.invalidations, self.invalidations.c.invalidated_at < cutoff, batch_size)
+        return total
+
+    def _delete_in_batches(self, table, condition, batch_size):
+        total = 0
+        while True:
+            # Remove em lotes para não segurar travas na tabela por muito tempo.
+            with db.engine.begin() as conn:
+                batch = select(table.c.id).where(condition).limit(batch_size).scalar_subquery()
+                deleted = conn.execute(delete(table).where(table.c.id.in_(batch))).rowcount
+            total += deleted
+            if deleted < batch_size:
+                return total
+
+    def _check_invalidations(self):
+        """Tira do cache as sessões alteradas ou removidas por outros processos desde a última consulta."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.invalidation_check_interval
+            last, since = self._last_invalidation, self._checked_at
+            self._checked_at = datetime.utcnow()
+
+        table, invalidations = self.table, self.invalidations
+        with db.engine.connect() as conn:
+            if last is None:
+                # Primeira consulta do processo: o cache ainda está vazio, só marca o ponto de partida.
+                last = conn.execute(select(func.max(invalidations.c.id))).scalar() or 0
+                removed, changed = [], []
+            else:
+                removed = conn.execute(
+                    select(invalidations.c.id, invalidations.c.session_id)
+                    .where(invalidations.c.id > last - INVALIDATION_OVERLAP)
+                ).all()
+                changed = conn.execute(
+                    select(table.c.id, table.c.updated_at)
+                    .where(table.c.updated_at > since - CHANGE_MARGIN)
+                ).all()
+
+        with self._lock:
+            removed = [row for row in removed if row.id not in self._applied]
+            self._last_invalidation = max([self._last_invalidation or 0, last] + [row.id for row in removed])
+            self._applied.update(row.id for row in removed)
+            self._applied = {applied for applied in self._applied
+                             if applied > self._last_invalidation - INVALIDATION_OVERLAP}
+            if removed:
+                self._generation += 1
+        for row in removed:
+            self.cache.delete(row.session_id)
+
+        # Só descarta as entradas cuja versão em cache é diferente da gravada no banco; as
+        # sessões gravadas por este processo, ou já relidas, continuam no cache.
+        for row in changed:
+            item = self.cache.get(row.id)
+            if item is not None and item[2] != row.updated_at:
+                self.cache.delete(row.id)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """SessionInterface do Flask que guarda as sessões em um SessionStore."""
+
+    session_class = ServerSideSession
+    null_session_class = NullServerSideSession
+
+    def __init__(self, store, skip_blueprints=()):
+        self.store = store
+        self.skip_blueprints = set(skip_blueprints)
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='server-side-session')
+
+    def _skips_session(self, app, request):
+        if not self.skip_blueprints:
+            return False
+        # A sessão é aberta antes de o Flask resolver a rota, então resolvemos aqui.
+        try:
+            endpoint, _ = app.create_url_adapter(request).match()
+        except HTTPException:
+            return False
+        return endpoint.rpartition('.')[0] in self.skip_blueprints
+
+    def open_session(self, app, request):
+        if self._skips_session(app, request):
+            # Rotas que não usam a sessão (ex: consultas da fila) não vão ao banco.
+            return self.make_null_session(app)
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self.session_class()
+
+        # A assinatura evita ir ao banco por causa de ids forjados.
+        try:
+            sid = self._signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return self.session_class()
+
+        item = self.store.load(sid)
+        if item is None:
+            return self.session_class()
+        data, expires_at = item
+        return self.session_class(data, sid=sid, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        def delete_cookie():
+            response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                   samesite=samesite, httponly=httponly)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.previous_sid is not None:
+            # Id trocado no login: a sessão com o id anterior deixa de existir.
+            self._release_request_connection()
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            # Sessão esvaziada (ex: logout): remove do servidor e apaga o cookie.
+            if session.modified and not session.new:
+                self._release_request_connection()
+                self.store.delete(session.sid)
+                delete_cookie()
+            return
+
+        # Só grava quando o conteúdo muda ou quando falta menos da metade da validade.
+        lifetime = app.permanent_session_lifetime
+        refresh = session.expires_at is not None and session.expires_at - datetime.utcnow() < lifetime / 2
+        if not (session.new or session.modified or refresh):
+            return
+
+        user = User.parse_id(session.get('_user_id')) # Chave usada pelo Flask-Login
+        expires_at = datetime.utcnow() + lifetime
+        self._release_request_connection()
+        if not self.store.save(session.sid, user[0] if user else None, dict(session), expires_at, session.new):
+            # A sessão foi encerrada em outra requisição (logout, revogação): não é recriada.
+            delete_cookie()
+            return
+
+        # O cookie só precisa ser reenviado quando é novo ou quando sua validade muda.
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+
+    @staticmethod
+    def _release_request_connection():
+        # A resposta já está pronta: devolve ao pool a conexão da db.session antes de o
+        # SessionStore pegar outra, senão requisições simultâneas podem esgotar o pool
+        # esperando cada uma pela sua segunda conexão.
+        db.session.close()
+
+
+def _regenerate_session(sender, **extra):
+    if isinstance(sender.session_interface, ServerSideSessionInterface):
+        session.regenerate()
+
+
+def init_app(app):
+    """Configura a aplicação para usar sessões no servidor."""
+    store = DatabaseSessionStore(app.config['SESSION_CACHE_SIZE'], app.config['SESSION_CACHE_TTL'],
+                                 app.config['SESSION_INVALIDATION_CHECK_INTERVAL'])
+    app.session_interface = ServerSideSessionInterface(store, app.config['SESSION_SKIP_BLUEPRINTS'])
+
+    # Novo id de sessão a cada login (pelo formulário ou pelo cookie "lembrar de mim") e logout.
+    user_logged_in.connect(_regenerate_session, app)
+    user_loaded_from_cookie.connect(_regenerate_session, app)
+    user_logged_out.connect(_regenerate_session, app)
+
+
+def revoke_user_sessions(app, user_id):
+    """Encerra todas as sessões de um usuário, inclusive o "lembrar de mim". Retorna quantas foram removidas."""
+    return _revoke_sessions(app, User.id == user_id)
+
+
+def revoke_role_sessions(app, role):
+    """Encerra as sessões de todos os usuários de um perfil (UserRole). Retorna quantas foram removidas."""
+    return _revoke_sessions(app, User.role == role)
+
+
+def _revoke_sessions(app, condition):
+    # A nova versão invalida o id guardado nas sessões e nos cookies "lembrar de mim" (User.get_id).
+    user_ids = db.session.execute(
+        update(User).where(condition)
+        .values(session_version=User.session_version + 1)
+        .returning(User.id)
+    ).scalars().all()
+    db.session.commit()
+    if not user_ids:
+        return 0
+    return app.session_interface.store.revoke_users(user_ids)
+
+
+def purge_expired_sessions(app):
+    """Remove as sessões expiradas em lotes de SESSION_PURGE_BATCH_SIZE."""
+    return app.session_interface.store.purge_expired(app.config['SESSION_PURGE_BATCH_SIZE'])
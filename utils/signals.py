@@ -0,0 +1,15 @@
+"""
+Sinais emitidos pelo blueprint de gerenciamento quando os cardápios mudam.
+
+Os caches da aplicação se inscrevem nestes sinais para descartar dados desatualizados
+(ex: o tipo de refeição guardado pela sala de espera). Os sinais só chegam ao processo
+que fez a alteração; os demais dependem da validade de seus caches.
+O remetente é sempre a aplicação Flask, como nos sinais do próprio Flask.
+"""
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+# Enviado com menu_id=<id> após criar, editar ou remover um cardápio.
+menu_changed = _signals.signal('menu-changed')
@@ -0,0 +1,222 @@
+"""
+Sala de espera virtual para a abertura das reservas.
+
+Quando as reservas do dia seguinte abrem, o volume de requisições sobe de uma vez e
+derruba os workers e o pool de conexões do banco. A sala de espera controla a entrada:
+cada tipo de refeição (MealType) tem um balde de fichas (token bucket) que libera
+no máximo WAITING_ROOM_RATES[tipo] reservas por segundo, com uma rajada inicial de
+WAITING_ROOM_BURST. Quem chega sem vaga recebe uma senha assinada com o horário em que
+poderá entrar, e a página de espera consulta posição e tempo estimado apenas
+verificando a assinatura da senha, sem acessar o banco.
+
+As taxas configuradas são o total da aplicação. Cada processo controla sua parte,
+dividindo taxa e rajada por WAITING_ROOM_WORKERS (o número de workers em execução).
+
+Cada senha fica presa à chave de idempotência da reserva. Depois da primeira entrada,
+novos envios com a mesma senha são atendidos pela resposta guardada (ou agrupados com
+a requisição em andamento), então a senha não serve para furar a fila várias vezes.
+Enquanto a requisição espera na fila, a senha fica guardada na sessão: reenvios com a
+mesma chave (ex: o navegador repetindo o POST) recebem a mesma senha, em vez de voltar
+para o fim da fila e gastar outra vaga. Isso custa uma gravação da sessão por chegada
+sem vaga (os reenvios não gravam nada).
+"""
+
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import request, current_app, session, redirect, url_for
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+from extensions import db
+from models.models import Menu, User
+from utils.lru_cache import LRUCache
+from utils.signals import menu_changed
+from utils.idempotency import request_idempotency_key, replay_completed, new_idempotency_key
+
+QUEUE_TICKET_HEADER = 'Queue-Ticket'
+QUEUE_TICKET_FORM_FIELD = 'queue_ticket'
+# Senhas emitidas como [menu_id, chave, senha], para reaproveitar nos reenvios da mesma chave
+QUEUE_TICKETS_SESSION_FIELD = '_queue_tickets'
+MAX_QUEUE_TICKETS = 10
+MEAL_TYPE_CACHE_SIZE = 1024 # Cardápios cujo MealType fica em cache em cada worker
+
+
+class TokenBucket:
+    """
+    Balde de fichas implementado como GCRA: guarda apenas o instante teórico da próxima
+    chegada, então reservar uma vaga custa O(1) e não depende de uma thread de reposição.
+    """
+
+    def __init__(self, rate, burst):
+        self.interval = 1.0 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self._tat = 0.0 # Theoretical arrival time
+        self._lock = threading.Lock()
+
+    def reserve(self, now=None):
+        """Reserva a próxima vaga e retorna o instante (time.time) em que ela pode ser usada."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tat = max(self._tat, now)
+            self._tat = tat + self.interval
+        return max(now, tat - self.tolerance)
+
+
+_buckets_lock = threading.Lock()
+
+
+def _state(app):
+    """Baldes por tipo de refeição e cache de menu_id -> nome do MealType da aplicação."""
+    state = app.extensions.get('waiting_room')
+    if state is None:
+        state = app.extensions.setdefault('waiting_room', {
+            'buckets': {}, 'meal_types': LRUCache(MEAL_TYPE_CACHE_SIZE)
+        })
+    return state
+
+
+def _get_bucket(meal_type):
+    buckets = _state(current_app)['buckets']
+    with _buckets_lock:
+        bucket = buckets.get(meal_type)
+        if bucket is None:
+            # Cada worker libera apenas a sua fração da taxa total configurada.
+            workers = current_app.config['WAITING_ROOM_WORKERS']
+            rate = current_app.config['WAITING_ROOM_RATES'][meal_type] / workers
+            burst = max(1, current_app.config['WAITING_ROOM_BURST'] // workers)
+            bucket = buckets[meal_type] = TokenBucket(rate, burst)
+        return bucket
+
+
+def _get_meal_type(menu_id):
+    # O tipo de refeição fica em cache para não consultar o banco a cada chegada. A validade
+    # limita por quanto tempo os outros workers usam o tipo antigo depois de uma edição.
+    meal_types = _state(current_app)['meal_types']
+    meal_type = meal_types.get(menu_id)
+    if meal_type is None:
+        menu = db.session.get(Menu, menu_id)
+        if menu is None:
+            return None
+        meal_type = menu.meal_type.name
+        meal_types.set(menu_id, meal_type, current_app.config['WAITING_ROOM_MEAL_TYPE_TTL'])
+    return meal_type
+
+
+@menu_changed.connect
+def _forget_menu(sender, menu_id, **extra):
+    # O tipo de refeição de um cardápio pode ter sido alterado; no worker que fez a edição,
+    # a mudança vale na hora.
+    _state(sender)['meal_types'].delete(menu_id)
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='waiting-room')
+
+
+def issue_ticket(user_id, menu_id, meal_type, admit_at, idempotency_key):
+    """Gera a senha assinada que dá direito a fazer uma reserva a partir de admit_at."""
+    return _serializer().dumps({
+        'u': user_id, 'm': menu_id, 't': meal_type, 'a': round(admit_at, 3), 'k': idempotency_key
+    })
+
+
+def read_ticket(ticket):
+    """Valida a assinatura e a idade da senha. Retorna o conteúdo ou None se for inválida."""
+    if not ticket:
+        return None
+    try:
+        return _serializer().loads(ticket, max_age=current_app.config['WAITING_ROOM_TICKET_MAX_AGE'])
+    except BadSignature:
+        return None
+
+
+def ticket_status(data, now=None):
+    """Calcula se a senha já pode entrar, a posição aproximada na fila e o tempo estimado."""
+    now = time.time() if now is None else now
+    wait = data['a'] - now
+    if wait <= 0:
+        return {'admitted': True, 'position': 0, 'eta': 0}
+    # A posição considera a taxa total, já que a fila é compartilhada por todos os workers.
+    rate = current_app.config['WAITING_ROOM_RATES'][data['t']]
+    return {'admitted': False, 'position': math.ceil(wait * rate), 'eta': math.ceil(wait)}
+
+
+def _session_user_id():
+    """Id do usuário logado lido direto da sessão, sem carregar o User do banco."""
+    # A versão da sessão só é conferida depois, pelo @login_required.
+    user = User.parse_id(session.get('_user_id')) # Chave usada pelo Flask-Login
+    return user[0] if user else None
+
+
+def waiting_room(f):
+    """
+    Decorador que controla a entrada nas rotas de reserva de um cardápio (parâmetro menu_id).
+    Deve ser aplicado antes do @login_required, para que as chegadas sem vaga sejam
+    atendidas sem carregar o usuário do banco.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user_id = _session_user_id()
+        if not current_app.config['WAITING_ROOM_ENABLED'] or user_id is None:
+            # Sem login, o @login_required redireciona para a página de login.
+            return f(*args, **kwargs)
+
+        # Reenvios de uma reserva já concluída recebem a resposta guardada sem gastar vaga.
+        replayed = replay_completed(user_id)
+        if replayed is not None:
+            return replayed
+
+        menu_id = kwargs['menu_id']
+        key = request_idempotency_key()
+        now = time.time()
+        ticket = request.headers.get(QUEUE_TICKET_HEADER) or request.form.get(QUEUE_TICKET_FORM_FIELD)
+        if not ticket and key:
+            # Reenvio de uma requisição que já está na fila: continua com a mesma senha.
+            ticket = _outstanding_ticket(menu_id, key)
+        data = read_ticket(ticket)
+
+        if data is not None and data['u'] == user_id and data['m'] == menu_id and data['k'] == key:
+            if data['a'] > now:
+                # Chegou antes da hora: volta para a página de espera.
+                return _redirect_to_queue(ticket, data['a'] - now)
+            if now - data['a'] <= current_app.config['WAITING_ROOM_ADMISSION_WINDOW']:
+                # O @idempotent garante que a senha produza uma única execução da rota.
+                return f(*args, **kwargs)
+            # A janela de entrada passou: entra na fila novamente.
+
+        meal_type = _get_meal_type(menu_id)
+        if meal_type is None:
+            # Cardápio inexistente; a própria rota responde com 404.
+            return f(*args, **kwargs)
+
+        admit_at = _get_bucket(meal_type).reserve(now)
+        if admit_at <= now:
+            return f(*args, **kwargs)
+
+        # A senha precisa de uma chave de idempotência para ser de uso único.
+        ticket = issue_ticket(user_id, menu_id, meal_type, admit_at, key or new_idempotency_key())
+        if key:
+            _remember_ticket(menu_id, key, ticket)
+        return _redirect_to_queue(ticket, admit_at - now)
+
+    return decorated_function
+
+
+def _outstanding_ticket(menu_id, key):
+    for ticket_menu_id, ticket_key, ticket in session.get(QUEUE_TICKETS_SESSION_FIELD, []):
+        if ticket_menu_id == menu_id and ticket_key == key:
+            return ticket
+    return None
+
+
+def _remember_ticket(menu_id, key, ticket):
+    tickets = [entry for entry in session.get(QUEUE_TICKETS_SESSION_FIELD, []) if entry[:2] != [menu_id, key]]
+    session[QUEUE_TICKETS_SESSION_FIELD] = (tickets + [[menu_id, key, ticket]])[-MAX_QUEUE_TICKETS:]
+
+
+def _redirect_to_queue(ticket, wait):
+    response = redirect(url_for('waiting_room.wait', ticket=ticket), code=303)
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response